@@ -15,24 +15,210 @@ import osmnx as ox
 import networkx as nx
 from datetime import datetime
 import folium
+from branca.element import MacroElement
+from jinja2 import Template
 import pandas as pd
+import numpy as np
+import argparse
 import json
+import multiprocessing
+import os
 import warnings
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 warnings.filterwarnings('ignore')
 
+try:
+    import orjson  # Opcional: serialización JSON más rápida
+except ImportError:
+    orjson = None
+
+# Cachear respuestas HTTP de OSM y grafos descargados para ejecuciones repetidas
+ox.settings.use_cache = True
+ox.settings.cache_folder = '.osmnx_cache'
+CARPETA_GRAFOS = Path('.graph_cache')
+
+# Máximo de intersecciones dibujadas en el mapa
+MAX_INTERSECCIONES_MAPA = 2000
+
+def _nombre_seguro(ciudad: str) -> str:
+    """Convierte el nombre de una ciudad en un nombre de archivo seguro"""
+    return ciudad.replace(',', '_').replace(' ', '')
+
+# Diccionario para traducir tipos de vías al español
+TRADUCCION_VIAS = {
+    'residential': 'Residencial',
+    'tertiary': 'Terciaria',
+    'secondary': 'Secundaria',
+    'primary': 'Principal',
+    'trunk': 'Troncal',
+    'unclassified': 'Sin clasificar',
+    'primary_link': 'Enlace principal',
+    'secondary_link': 'Enlace secundario',
+    'tertiary_link': 'Enlace terciario',
+    'trunk_link': 'Enlace troncal',
+    'service': 'Servicio',
+    'living_street': 'Calle residencial',
+    'pedestrian': 'Peatonal',
+    'footway': 'Sendero peatonal',
+    'cycleway': 'Ciclovía',
+    'track': 'Pista',
+    'path': 'Sendero',
+    'steps': 'Escalones',
+    'motorway': 'Autopista',
+    'motorway_link': 'Enlace autopista'
+}
+
+# Plantilla del reporte de texto, se rellena con las estadísticas del análisis
+PLANTILLA_REPORTE = """
+{separador}
+    REPORTE DE ANÁLISIS DE TRÁFICO
+    Ciudad: {ciudad}
+    Fecha: {fecha}
+{separador}
+
+📍 FUENTES DE DATOS:
+• OpenStreetMap (OSM)
+• OSMnx - Análisis de redes urbanas
+• NetworkX - Análisis de grafos
+• Algoritmos de estimación de tráfico
+
+🏙️  INFORMACIÓN GENERAL DE LA CIUDAD:
+• Total de intersecciones: {intersecciones:,}
+• Total de segmentos de calles: {segmentos_calles:,}
+• Calles con nombre identificado: {calles_nombradas:,}
+• Longitud total de red vial: {longitud_total_km} km
+
+🔀 ANÁLISIS DE INTERSECCIONES:
+• Intersecciones simples (≤2 conexiones): {intersecciones_simples:,}
+• Intersecciones en T (3 conexiones): {intersecciones_t:,}
+• Intersecciones complejas (≥4 conexiones): {intersecciones_complejas:,}
+
+🛣️  TIPOS DE VÍAS IDENTIFICADAS:
+{tipos_vias}
+
+🚦 ANÁLISIS DE SEMÁFOROS:
+• Semáforos registrados en OSM: {semaforos_osm}
+• Total de semáforos: {semaforos_total}
+
+🚗 ANÁLISIS DE TRÁFICO ACTUAL:
+• Hora de análisis: {trafico[hora]}
+• Período del día: {trafico[periodo]}
+• Tipo de día: {trafico[tipo_dia]}
+• Nivel de tráfico: {trafico[descripcion]}
+• Factor numérico: {trafico[nivel_numerico]}
+
+📊 METODOLOGÍA UTILIZADA:
+• Red vial extraída de OpenStreetMap
+• Intersecciones analizadas por grado de conectividad
+• Semáforos identificados por etiquetas OSM y estimación basada en intersecciones
+• Tráfico estimado por patrones horarios y tipos de vía
+
+⚠️  LIMITACIONES:
+• Tráfico basado en estimaciones, no datos en tiempo real
+• Calidad de datos OSM varía por región
+• Semáforos parcialmente estimados
+• No incluye eventos especiales o incidentes
+
+💡 RECOMENDACIONES:
+• Los datos son más precisos en áreas urbanas bien mapeadas
+• Para tráfico en tiempo real, considerar APIs oficiales de tráfico
+• Verificar semáforos estimados con observación directa
+• Actualizar análisis periódicamente
+
+{separador}
+SISTEMA DE ANÁLISIS DE TRÁFICO URBANO
+OpenStreetMap | OSMnx | NetworkX | Folium
+Generado: {fecha}
+{separador}
+"""
+
+class PanelInformacion(MacroElement):
+    """Panel fijo con el resumen del análisis, renderizado desde una plantilla compilada una vez"""
+    _template = Template('''
+        {% macro html(this, kwargs) %}
+            <div style="position: fixed; 
+                        top: 10px; left: 10px; width: 320px; height: auto; 
+                        background-color: white; border:2px solid grey; z-index:9999; 
+                        font-size:13px; padding: 15px; border-radius: 5px;
+                        box-shadow: 0 2px 6px rgba(0,0,0,0.3);">
+            <h4 style="margin-top: 0; margin-bottom: 10px; font-size: 16px;">Análisis de Tráfico - {{ this.ciudad }}</h4>
+            <div style="line-height: 1.8;">
+                <b>Intersecciones:</b> {{ this.stats.intersecciones }}<br>
+                <b>Calles:</b> {{ this.stats.calles }}<br>
+                <b>Semáforos:</b> {{ this.stats.semaforos }}<br>
+                <b>Tráfico:</b> {{ this.stats.trafico }}<br>
+            </div>
+            <hr style="margin: 10px 0; border: none; border-top: 1px solid #ccc;">
+            <div style="font-size: 12px;">
+                🔴 Intersección compleja<br>
+                🟠 Intersección en T
+            </div>
+            </div>
+        {% endmacro %}
+    ''')
+    
+    def __init__(self, ciudad: str, stats: dict):
+        super().__init__()
+        self._name = 'PanelInformacion'
+        self.ciudad = ciudad
+        self.stats = stats
+
 class ExtractorTrafico:
+    # Factores de tráfico por hora (0-23) y por día de la semana (0=Lunes, 6=Domingo)
+    _FACTOR_HORA = np.full(24, 0.3)
+    _FACTOR_HORA[7:10] = 1.0
+    _FACTOR_HORA[12:15] = 0.8
+    _FACTOR_HORA[17:20] = 1.0
+    _FACTOR_HORA[20:23] = 0.6
+    _PERIODO_HORA = np.full(24, "Horario nocturno/madrugada", dtype=object)
+    _PERIODO_HORA[7:10] = "Hora pico matutina"
+    _PERIODO_HORA[12:15] = "Hora almuerzo"
+    _PERIODO_HORA[17:20] = "Hora pico vespertina"
+    _PERIODO_HORA[20:23] = "Noche activa"
+    _FACTOR_DIA = np.array([1.0] * 5 + [0.7, 0.5])
+    _TIPO_DIA = ["Día laboral"] * 5 + ["Sábado", "Domingo"]
+    
     def __init__(self, ciudad: str = "Cali, Colombia"):
         self.ciudad = ciudad
+        self.sufijo_archivos = ""
         self.G = None
         self.estadisticas = {}
         
+    def _grados(self):
+        """Devuelve el grado de cada nodo en el orden de self.G.nodes"""
+        return np.fromiter((g for _, g in self.G.degree()), dtype=np.int32, count=self.G.number_of_nodes())
+        
+    def _guardar_grafo_cache(self, ruta_cache: Path):
+        """Guarda el grafo en caché sin interrumpir el análisis si falla la escritura"""
+        # Escribir a un archivo temporal y renombrarlo para no dejar un caché truncado;
+        # el temporal conserva la extensión .gz para que se escriba comprimido
+        ruta_temporal = ruta_cache.with_name(f"{os.getpid()}.tmp.{ruta_cache.name}")
+        try:
+            CARPETA_GRAFOS.mkdir(exist_ok=True)
+            ox.save_graphml(self.G, ruta_temporal)
+            os.replace(ruta_temporal, ruta_cache)
+        except Exception as e:
+            print(f"⚠️  No se pudo guardar la red vial en caché: {e}")
+            try:
+                ruta_temporal.unlink()
+            except OSError:
+                pass
+    
     def extraer_datos_basicos(self):
         """Extrae datos básicos de la red vial"""
-        print(f"📍 Descargando red vial de {self.ciudad}...")
-        
         try:
-            # Descargar grafo de la ciudad
-            self.G = ox.graph_from_place(self.ciudad, network_type="drive")
+            ruta_cache = CARPETA_GRAFOS / f"{_nombre_seguro(self.ciudad)}.graphml.gz"
+            
+            if ruta_cache.exists():
+                # Reutilizar grafo guardado en una ejecución anterior
+                print(f"📍 Cargando red vial de {self.ciudad} desde caché...")
+                self.G = ox.load_graphml(ruta_cache)
+            else:
+                # Descargar grafo de la ciudad
+                print(f"📍 Descargando red vial de {self.ciudad}...")
+                self.G = ox.graph_from_place(self.ciudad, network_type="drive")
+                self._guardar_grafo_cache(ruta_cache)
             
             # Obtener estadísticas básicas
             num_nodos = len(self.G.nodes)
@@ -61,12 +247,13 @@ class ExtractorTrafico:
             return
         
         # Analizar grado de cada nodo (número de conexiones)
-        grados = dict(self.G.degree())
+        grados = self._grados()
+        conteo = np.bincount(grados, minlength=4)
         
         # Clasificar intersecciones
-        intersecciones_simples = sum(1 for g in grados.values() if g <= 2)
-        intersecciones_t = sum(1 for g in grados.values() if g == 3)
-        intersecciones_complejas = sum(1 for g in grados.values() if g >= 4)
+        intersecciones_simples = int(conteo[:3].sum())
+        intersecciones_t = int(conteo[3])
+        intersecciones_complejas = int(conteo[4:].sum())
         
         print(f"✅ Análisis de intersecciones:")
         print(f"   • Simples (≤2 conexiones): {intersecciones_simples:,}")
@@ -93,57 +280,31 @@ class ExtractorTrafico:
             return
         
         try:
-            # Convertir a GeoDataFrame para análisis
-            _, edges_gdf = ox.graph_to_gdfs(self.G)
-            
-            # Diccionario para traducir tipos de vías al español
-            traduccion_vias = {
-                'residential': 'Residencial',
-                'tertiary': 'Terciaria',
-                'secondary': 'Secundaria',
-                'primary': 'Principal',
-                'trunk': 'Troncal',
-                'unclassified': 'Sin clasificar',
-                'primary_link': 'Enlace principal',
-                'secondary_link': 'Enlace secundario',
-                'tertiary_link': 'Enlace terciario',
-                'trunk_link': 'Enlace troncal',
-                'service': 'Servicio',
-                'living_street': 'Calle residencial',
-                'pedestrian': 'Peatonal',
-                'footway': 'Sendero peatonal',
-                'cycleway': 'Ciclovía',
-                'track': 'Pista',
-                'path': 'Sendero',
-                'steps': 'Escalones',
-                'motorway': 'Autopista',
-                'motorway_link': 'Enlace autopista'
-            }
-            
-            # Contar tipos de vías
+            # Leer atributos directamente del grafo, sin construir geometrías
+            tipos, nombres, longitudes = [], [], []
+            for _, _, datos in self.G.edges(data=True):
+                # Tipo de vía (si hay varios, se toma el primero)
+                tipo = datos.get('highway', 'unknown')
+                if isinstance(tipo, list):
+                    tipo = tipo[0] if tipo else 'unknown'
+                tipos.append(tipo)
+                nombres.append(datos.get('name'))
+                longitudes.append(datos.get('length', 0))
+            
+            # Contar tipos de vías y traducir al español cada tipo una sola vez
+            valores, cantidades = np.unique(np.array(tipos, dtype=str), return_counts=True)
             tipos_vias = {}
-            calles_nombradas = 0
-            longitud_total = 0
-            
-            for _, edge in edges_gdf.iterrows():
-                # Tipo de vía
-                highway_type = edge.get('highway', 'unknown')
-                if isinstance(highway_type, list):
-                    highway_type = highway_type[0] if highway_type else 'unknown'
-                
-                # Traducir al español
-                tipo_español = traduccion_vias.get(highway_type, highway_type.title())
-                tipos_vias[tipo_español] = tipos_vias.get(tipo_español, 0) + 1
-                
-                # Contar calles con nombre
-                name = edge.get('name')
-                if name and str(name).lower() not in ['nan', 'none', '']:
-                    calles_nombradas += 1
-                
-                # Sumar longitud
-                length = edge.get('length', 0)
-                if isinstance(length, (int, float)) and length > 0:
-                    longitud_total += length
+            for tipo, cantidad in zip(valores.tolist(), cantidades.tolist()):
+                tipo_español = TRADUCCION_VIAS.get(tipo, tipo.title())
+                tipos_vias[tipo_español] = tipos_vias.get(tipo_español, 0) + cantidad
+            
+            # Contar calles con nombre
+            nombres = pd.Series(nombres, dtype=object).dropna().astype(str).str.strip().str.lower()
+            calles_nombradas = int((~nombres.isin(['nan', 'none', ''])).sum())
+            
+            # Sumar longitud
+            longitudes = pd.to_numeric(pd.Series(longitudes, dtype=object), errors='coerce').to_numpy(dtype=np.float64)
+            longitud_total = float(longitudes[longitudes > 0].sum())
             
             print(f"✅ Análisis de calles:")
             print(f"   • Calles con nombre: {calles_nombradas:,}")
@@ -171,7 +332,7 @@ class ExtractorTrafico:
         print("🚦 Buscando semáforos en OSM...")
         
         try:
-            # Buscar elementos marcados como semáforos
+            # Buscar elementos marcados como semáforos (la caché HTTP de OSMnx evita repetir la consulta)
             tags = {"highway": "traffic_signals"}
             semaforos = ox.features_from_place(self.ciudad, tags)
             
@@ -198,36 +359,16 @@ class ExtractorTrafico:
         """Estima condiciones de tráfico basado en hora y tipos de vía"""
         print("🚗 Estimando condiciones de tráfico...")
         
-        hora_actual = datetime.now().hour
-        dia_semana = datetime.now().weekday()  # 0=Lunes, 6=Domingo
+        ahora = datetime.now()
+        hora_actual = ahora.hour
+        dia_semana = ahora.weekday()  # 0=Lunes, 6=Domingo
+        hora_texto = ahora.strftime('%H:%M')
         
-        # Factores base por hora
-        if 7 <= hora_actual <= 9:
-            factor_hora = 1.0
-            periodo = "Hora pico matutina"
-        elif 12 <= hora_actual <= 14:
-            factor_hora = 0.8
-            periodo = "Hora almuerzo"
-        elif 17 <= hora_actual <= 19:
-            factor_hora = 1.0
-            periodo = "Hora pico vespertina"
-        elif 20 <= hora_actual <= 22:
-            factor_hora = 0.6
-            periodo = "Noche activa"
-        else:
-            factor_hora = 0.3
-            periodo = "Horario nocturno/madrugada"
-        
-        # Factor por día de la semana
-        if dia_semana < 5:  # Lunes a viernes
-            factor_dia = 1.0
-            tipo_dia = "Día laboral"
-        elif dia_semana == 5:  # Sábado
-            factor_dia = 0.7
-            tipo_dia = "Sábado"
-        else:  # Domingo
-            factor_dia = 0.5
-            tipo_dia = "Domingo"
+        # Factores por hora y día de la semana desde tablas precalculadas
+        factor_hora = float(self._FACTOR_HORA[hora_actual])
+        periodo = self._PERIODO_HORA[hora_actual]
+        factor_dia = float(self._FACTOR_DIA[dia_semana])
+        tipo_dia = self._TIPO_DIA[dia_semana]
         
         # Calcular nivel de tráfico general
         nivel_trafico = factor_hora * factor_dia
@@ -240,14 +381,14 @@ class ExtractorTrafico:
             descripcion_trafico = "Bajo - Flujo libre"
         
         print(f"✅ Estimación de tráfico:")
-        print(f"   • Hora: {datetime.now().strftime('%H:%M')} - {periodo}")
+        print(f"   • Hora: {hora_texto} - {periodo}")
         print(f"   • Día: {tipo_dia}")
         print(f"   • Nivel general: {descripcion_trafico}")
         print(f"   • Factor numérico: {nivel_trafico:.2f}")
         
         # Guardar estadísticas
         self.estadisticas['trafico'] = {
-            'hora': datetime.now().strftime('%H:%M'),
+            'hora': hora_texto,
             'periodo': periodo,
             'tipo_dia': tipo_dia,
             'nivel_numerico': round(nivel_trafico, 2),
@@ -258,80 +399,29 @@ class ExtractorTrafico:
         
         return nivel_trafico
     
-    def generar_reporte_completo(self):
+    def generar_reporte_completo(self, ahora: datetime = None):
         """Genera un reporte completo con todos los datos"""
         print("\n📋 Generando reporte completo...")
         
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        nombre_archivo = f"reporte_trafico{timestamp}.txt"
-        
-        reporte = f"""
-{'='*80}
-    REPORTE DE ANÁLISIS DE TRÁFICO
-    Ciudad: {self.ciudad.upper()}
-    Fecha: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-{'='*80}
-
-📍 FUENTES DE DATOS:
-• OpenStreetMap (OSM)
-• OSMnx - Análisis de redes urbanas
-• NetworkX - Análisis de grafos
-• Algoritmos de estimación de tráfico
-
-🏙️  INFORMACIÓN GENERAL DE LA CIUDAD:
-• Total de intersecciones: {self.estadisticas.get('intersecciones', 0):,}
-• Total de segmentos de calles: {self.estadisticas.get('segmentos_calles', 0):,}
-• Calles con nombre identificado: {self.estadisticas.get('calles_nombradas', 0):,}
-• Longitud total de red vial: {self.estadisticas.get('longitud_total_km', 0)} km
-
-🔀 ANÁLISIS DE INTERSECCIONES:
-• Intersecciones simples (≤2 conexiones): {self.estadisticas.get('intersecciones_simples', 0):,}
-• Intersecciones en T (3 conexiones): {self.estadisticas.get('intersecciones_t', 0):,}
-• Intersecciones complejas (≥4 conexiones): {self.estadisticas.get('intersecciones_complejas', 0):,}
-
-🛣️  TIPOS DE VÍAS IDENTIFICADAS:
-"""
-        
-        if 'tipos_vias' in self.estadisticas:
-            for tipo, cantidad in self.estadisticas['tipos_vias'].items():
-                reporte += f"• {tipo}: {cantidad:,} segmentos\n"
+        ahora = ahora or datetime.now()
+        timestamp = ahora.strftime("%Y%m%d_%H%M%S")
+        fecha = ahora.strftime("%Y-%m-%d %H:%M:%S")
+        nombre_archivo = f"reporte_trafico{timestamp}{self.sufijo_archivos}.txt"
         
-        reporte += f"""
-🚦 ANÁLISIS DE SEMÁFOROS:
-• Semáforos registrados en OSM: {self.estadisticas.get('semaforos_osm', 0)}
-• Total de semáforos: {self.estadisticas.get('semaforos_total', 0)}
-
-🚗 ANÁLISIS DE TRÁFICO ACTUAL:
-• Hora de análisis: {self.estadisticas.get('trafico', {}).get('hora', 'N/A')}
-• Período del día: {self.estadisticas.get('trafico', {}).get('periodo', 'N/A')}
-• Tipo de día: {self.estadisticas.get('trafico', {}).get('tipo_dia', 'N/A')}
-• Nivel de tráfico: {self.estadisticas.get('trafico', {}).get('descripcion', 'N/A')}
-• Factor numérico: {self.estadisticas.get('trafico', {}).get('nivel_numerico', 0)}
-
-📊 METODOLOGÍA UTILIZADA:
-• Red vial extraída de OpenStreetMap
-• Intersecciones analizadas por grado de conectividad
-• Semáforos identificados por etiquetas OSM y estimación basada en intersecciones
-• Tráfico estimado por patrones horarios y tipos de vía
-
-⚠️  LIMITACIONES:
-• Tráfico basado en estimaciones, no datos en tiempo real
-• Calidad de datos OSM varía por región
-• Semáforos parcialmente estimados
-• No incluye eventos especiales o incidentes
-
-💡 RECOMENDACIONES:
-• Los datos son más precisos en áreas urbanas bien mapeadas
-• Para tráfico en tiempo real, considerar APIs oficiales de tráfico
-• Verificar semáforos estimados con observación directa
-• Actualizar análisis periódicamente
-
-{'='*80}
-SISTEMA DE ANÁLISIS DE TRÁFICO URBANO
-OpenStreetMap | OSMnx | NetworkX | Folium
-Generado: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-{'='*80}
-"""
+        valores = {
+            'intersecciones': 0, 'segmentos_calles': 0, 'calles_nombradas': 0, 'longitud_total_km': 0,
+            'intersecciones_simples': 0, 'intersecciones_t': 0, 'intersecciones_complejas': 0,
+            'semaforos_osm': 0, 'semaforos_total': 0,
+            **self.estadisticas
+        }
+        valores['trafico'] = {
+            'hora': 'N/A', 'periodo': 'N/A', 'tipo_dia': 'N/A', 'descripcion': 'N/A', 'nivel_numerico': 0,
+            **self.estadisticas.get('trafico', {})
+        }
+        valores['tipos_vias'] = "\n".join(f"• {tipo}: {cantidad:,} segmentos"
+                                          for tipo, cantidad in self.estadisticas.get('tipos_vias', {}).items())
+        valores.update(separador='=' * 80, ciudad=self.ciudad.upper(), fecha=fecha)
+        reporte = PLANTILLA_REPORTE.format_map(valores)
         
         # Guardar reporte
         try:
@@ -349,9 +439,28 @@ Generado: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
         except Exception as e:
             print(f"❌ Error guardando reporte: {e}")
     
-    def crear_mapa_resumen(self):
+    def exportar_json(self, ruta: str = None, ahora: datetime = None):
+        """Exporta las estadísticas del análisis en formato JSON"""
+        if ruta is None:
+            ahora = ahora or datetime.now()
+            ruta = f"estadisticas_trafico{ahora.strftime('%Y%m%d_%H%M%S')}{self.sufijo_archivos}.json"
+        
+        try:
+            if orjson is not None:
+                Path(ruta).write_bytes(orjson.dumps(self.estadisticas, option=orjson.OPT_INDENT_2))
+            else:
+                Path(ruta).write_text(json.dumps(self.estadisticas, ensure_ascii=False, indent=2), encoding='utf-8')
+            print(f"📄 Estadísticas JSON guardadas en: {ruta}")
+            return ruta
+            
+        except Exception as e:
+            print(f"❌ Error exportando JSON: {e}")
+            return None
+    
+    def crear_mapa_resumen(self, ahora: datetime = None):
         """Crea un mapa con resumen de datos principales"""
         print("🗺️  Creando mapa resumen...")
+        ahora = ahora or datetime.now()
         
         if self.G is None:
             print("❌ No hay datos para el mapa")
@@ -359,73 +468,56 @@ Generado: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
         
         try:
             # Obtener centro de la ciudad
-            nodos_gdf, _ = ox.graph_to_gdfs(self.G)
+            nodos_gdf = ox.graph_to_gdfs(self.G, edges=False)
             centro_lat = nodos_gdf.y.mean()
             centro_lon = nodos_gdf.x.mean()
             
             # Crear mapa
             m = folium.Map(location=[centro_lat, centro_lon], zoom_start=11)
             
-            # Agregar algunas intersecciones importantes (cada 100 para no saturar)
-            intersecciones_muestra = nodos_gdf.iloc[::100]
-            
-            for _, nodo in intersecciones_muestra.iterrows():
-                # Calcular grado del nodo
-                node_id = nodo.name
-                grado = self.G.degree[node_id] if node_id in self.G else 2
-                
-                # Color según complejidad
-                if grado >= 4:
-                    color = "red"
-                    radius = 4
-                elif grado == 3:
-                    color = "orange"
-                    radius = 2
-                else:
-                    color = "blue"
-                    radius = 1
+            # Agregar solo intersecciones en T y complejas (con un máximo para no saturar)
+            grados = self._grados()  # mismo orden que nodos_gdf (self.G.nodes)
+            mascara = grados >= 3
+            intersecciones_muestra = nodos_gdf.loc[mascara, ['geometry']].assign(grado=grados[mascara].astype(int))
+            if len(intersecciones_muestra) > MAX_INTERSECCIONES_MAPA:
+                intersecciones_muestra = intersecciones_muestra.sample(MAX_INTERSECCIONES_MAPA, random_state=0)
+            
+            if len(intersecciones_muestra) > 0:
+                # Color y tamaño según complejidad
+                complejas = intersecciones_muestra['grado'] >= 4
+                intersecciones_muestra['color'] = np.where(complejas, "red", "orange")
+                intersecciones_muestra['radius'] = np.where(complejas, 4, 2)
                 
-                folium.CircleMarker(
-                    location=[nodo.y, nodo.x],
-                    radius=radius,
-                    color=color,
-                    fill=True,
-                    popup=f"Intersección: {grado} conexiones"
+                # Una sola capa GeoJSON en lugar de un marcador por intersección
+                folium.GeoJson(
+                    intersecciones_muestra,
+                    name="Intersecciones",
+                    marker=folium.CircleMarker(fill=True),
+                    style_function=lambda f: {
+                        'color': f['properties']['color'],
+                        'radius': f['properties']['radius']
+                    },
+                    popup=folium.GeoJsonPopup(fields=['grado'], aliases=['Conexiones:'])
                 ).add_to(m)
+            folium.LayerControl().add_to(m)
             
             # Agregar información en el mapa
-            info_html = f'''
-            <div style="position: fixed; 
-                        top: 10px; left: 10px; width: 320px; height: auto; 
-                        background-color: white; border:2px solid grey; z-index:9999; 
-                        font-size:13px; padding: 15px; border-radius: 5px;
-                        box-shadow: 0 2px 6px rgba(0,0,0,0.3);">
-            <h4 style="margin-top: 0; margin-bottom: 10px; font-size: 16px;">Análisis de Tráfico - {self.ciudad}</h4>
-            <div style="line-height: 1.8;">
-                <b>Intersecciones:</b> {self.estadisticas.get('intersecciones', 0):,}<br>
-                <b>Calles:</b> {self.estadisticas.get('calles_nombradas', 0):,}<br>
-                <b>Semáforos:</b> {self.estadisticas.get('semaforos_total', 0):,}<br>
-                <b>Tráfico:</b> {self.estadisticas.get('trafico', {}).get('descripcion', 'N/A')}<br>
-            </div>
-            <hr style="margin: 10px 0; border: none; border-top: 1px solid #ccc;">
-            <div style="font-size: 12px;">
-                🔴 Intersección compleja<br>
-                🟠 Intersección en T<br>
-                🔵 Intersección simple
-            </div>
-            </div>
-            '''
-            m.get_root().html.add_child(folium.Element(info_html))
+            m.get_root().add_child(PanelInformacion(self.ciudad, {
+                'intersecciones': f"{self.estadisticas.get('intersecciones', 0):,}",
+                'calles': f"{self.estadisticas.get('calles_nombradas', 0):,}",
+                'semaforos': f"{self.estadisticas.get('semaforos_total', 0):,}",
+                'trafico': self.estadisticas.get('trafico', {}).get('descripcion', 'N/A')
+            }))
             
             # Guardar mapa
-            nombre_mapa = f"mapa_trafico{datetime.now().strftime('%Y%m%d_%H%M%S')}.html"
+            nombre_mapa = f"mapa_trafico{ahora.strftime('%Y%m%d_%H%M%S')}{self.sufijo_archivos}.html"
             m.save(nombre_mapa)
             print(f"🗺️  Mapa guardado como: {nombre_mapa}")
             
         except Exception as e:
             print(f"⚠️  Error creando mapa: {e}")
     
-    def ejecutar_analisis_completo(self):
+    def ejecutar_analisis_completo(self, paralelo: bool = False):
         """Ejecuta el análisis completo de la ciudad"""
         print("🚀 INICIANDO ANÁLISIS COMPLETO")
         print("="*50)
@@ -435,23 +527,37 @@ Generado: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
             if not self.extraer_datos_basicos():
                 return False
             
-            # Paso 2: Analizar intersecciones
-            self.analizar_intersecciones()
-            
-            # Paso 3: Analizar calles
-            self.extraer_calles_principales()
-            
-            # Paso 4: Buscar semáforos
-            self.buscar_semaforos_osm()
+            if paralelo:
+                # Paso 4 en un hilo: la consulta a Overpass espera a la red mientras
+                # los pasos 2, 3 y 5 se calculan en este mismo proceso
+                with ThreadPoolExecutor(max_workers=1) as ex:
+                    semaforos = ex.submit(self.buscar_semaforos_osm)
+                    self.analizar_intersecciones()
+                    self.extraer_calles_principales()
+                    self.estimar_trafico_actual()
+                    semaforos.result()
+            else:
+                # Paso 2: Analizar intersecciones
+                self.analizar_intersecciones()
+                
+                # Paso 3: Analizar calles
+                self.extraer_calles_principales()
+                
+                # Paso 4: Buscar semáforos
+                self.buscar_semaforos_osm()
+                
+                # Paso 5: Estimar tráfico
+                self.estimar_trafico_actual()
             
-            # Paso 5: Estimar tráfico
-            self.estimar_trafico_actual()
+            # Una sola marca de tiempo para todos los archivos de esta ejecución
+            ahora = datetime.now()
             
-            # Paso 6: Generar reporte
-            self.generar_reporte_completo()
+            # Paso 6: Generar reporte y exportar estadísticas
+            self.generar_reporte_completo(ahora)
+            self.exportar_json(ahora=ahora)
             
             # Paso 7: Crear mapa
-            self.crear_mapa_resumen()
+            self.crear_mapa_resumen(ahora)
             
             print("\n🎉 ANÁLISIS COMPLETADO EXITOSAMENTE")
             print("📁 Revisa los archivos generados")
@@ -462,8 +568,38 @@ Generado: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
             print(f"❌ Error en el análisis: {e}")
             return False
 
+def _analizar_ciudad(ciudad: str, paralelo: bool = False):
+    """Analiza una ciudad en un proceso aparte con su propia caché de OSMnx"""
+    ox.settings.cache_folder = os.path.join('.osmnx_cache', _nombre_seguro(ciudad))
+    extractor = ExtractorTrafico(ciudad)
+    # Evitar colisiones entre los archivos generados por cada proceso
+    extractor.sufijo_archivos = f"_{_nombre_seguro(ciudad)}"
+    return ciudad, extractor.ejecutar_analisis_completo(paralelo=paralelo)
+
+def analizar_ciudades(lista_ciudades: list, paralelo: bool = False):
+    """Analiza varias ciudades en paralelo, un proceso por ciudad"""
+    procesos = min(len(lista_ciudades), os.cpu_count() or 1)
+    print(f"\n🏙️  Analizando {len(lista_ciudades)} ciudades con {procesos} procesos...")
+    print("⏳ Este proceso puede tomar unos minutos...")
+    
+    with multiprocessing.Pool(procesos) as pool:
+        resultados = pool.starmap(_analizar_ciudad, [(ciudad, paralelo) for ciudad in lista_ciudades])
+    
+    for ciudad, exito in resultados:
+        if exito:
+            print(f"✅ ANÁLISIS EXITOSO PARA {ciudad}")
+        else:
+            print(f"❌ Error en el análisis de {ciudad}")
+
 def main():
     """Función principal"""
+    parser = argparse.ArgumentParser(description="Análisis de redes viales y estimación de tráfico")
+    parser.add_argument('--ciudades', nargs='+', metavar='CIUDAD',
+                        help='Ciudades a analizar en paralelo (nombre o número del menú)')
+    parser.add_argument('--paralelo', action='store_true',
+                        help='Consultar los semáforos en OSM mientras se analiza la red descargada')
+    args = parser.parse_args()
+    
     print("🚦 EXTRACTOR DE TRÁFICO URBANO")
     print("="*50)
     print("Análisis de redes viales y estimación de tráfico")
@@ -478,6 +614,20 @@ def main():
         '5': 'Cartagena, Colombia'
     }
     
+    if args.ciudades:
+        # Un número que no está en el menú no es un nombre de ciudad válido
+        invalidas = [c for c in args.ciudades if c.strip().isdigit() and c not in ciudades]
+        if invalidas:
+            print(f"❌ Selección inválida: {', '.join(invalidas)}")
+            return
+        
+        try:
+            # Resolver números del menú y quitar ciudades repetidas
+            analizar_ciudades(list(dict.fromkeys(ciudades.get(c, c) for c in args.ciudades)), args.paralelo)
+        except KeyboardInterrupt:
+            print("\n\n⚠️  Análisis interrumpido por el usuario")
+        return
+    
     print("\nSelecciona una ciudad para analizar:")
     for key, ciudad in ciudades.items():
         print(f"  {key}. {ciudad}")
@@ -492,7 +642,7 @@ def main():
             
             # Crear y ejecutar extractor
             extractor = ExtractorTrafico(ciudad_seleccionada)
-            exito = extractor.ejecutar_analisis_completo()
+            exito = extractor.ejecutar_analisis_completo(paralelo=args.paralelo)
             
             if exito:
                 print(f"\n✅ ANÁLISIS EXITOSO PARA {ciudad_seleccionada}")